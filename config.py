@@ -6,6 +6,11 @@ DEFAULT_BALANCE_USDT = 100
 # Exchange settings
 # Using Binance as default, no API key needed for public data
 EXCHANGE_ID = 'binance'
+# 'live' - talk to the exchange, 'record' - live and save every response to
+# CASSETTE_FILE, 'replay' - serve responses from CASSETTE_FILE offline
+EXCHANGE_MODE = 'live'
+CASSETTE_FILE = 'cassettes/binance.jsonl.gz'
+REPLAY_SPEED = 1.0  # 1.0 = recorded latency, 0 = no delay
 
 # Number of top coins by volume to track
 TOP_N_COINS_BY_VOLUME = 20
@@ -19,3 +24,17 @@ DEFAULT_SL_PERCENTAGE = 0.03 # 3%
 DEFAULT_SWING_LOW_PERIOD = 14 # Last 14 candles
 DEFAULT_RISK_REWARD_TP1 = 1.5
 DEFAULT_RISK_REWARD_TP2 = 3.0
+
+# Memory budget for memoized indicator series (LRU-evicted)
+INDICATOR_CACHE_MAX_BYTES = 32 * 1024 * 1024  # 32 MB
+
+# Candle and indicator caches are snapshotted here on shutdown and restored on startup
+STATE_FILE = 'state.pkl'
+
+# Logging: INFO keeps one summary per cycle, DEBUG adds per-symbol rejection details
+LOG_LEVEL = 'INFO'
+
+# /chart rendering
+CHART_CANDLES = 100  # candles shown on a chart
+CHART_WORKERS = 2  # processes in the rendering pool
+CHART_CACHE_MAX_BYTES = 16 * 1024 * 1024  # 16 MB of cached PNGs
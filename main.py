@@ -1,17 +1,37 @@
 import asyncio
+import logging
 import schedule
 import time
+from collections import Counter
 from config import EXCHANGE_ID, TOP_N_COINS_BY_VOLUME, DEFAULT_TIMEFRAME, BOT_USER_ID
 from modules.data_fetcher import get_exchange, fetch_ohlcv, get_top_volume_symbols
 from modules.indicator_calculator import add_indicators
 from modules.signal_generator import check_long_signal
-from modules.position_tracker import check_open_positions
-from modules.database import get_open_forecast, add_open_forecast
-from modules.telegram_bot import dp, bot, send_message, format_signal_message, format_closure_message
+from modules.position_tracker import check_open_positions, track_forecast
+from modules.database import is_signal_open, add_open_forecast
+from modules.telegram_bot import dp, bot, send_message, send_signal, format_closure_message, set_exchange
+from modules.chart_renderer import get_chart, shutdown_chart_pool
+from modules.state_store import save_state, restore_state
+from modules.logger import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# Strong references to background tasks; the event loop only keeps weak ones
+_background_tasks = set()
+
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
 
 # --- Основной цикл анализа ---
 async def run_analysis_cycle(exchange):
-    print(f"\n[{time.ctime()}] Running analysis cycle...")
+    logger.info("Running analysis cycle...")
+    started = time.perf_counter()
+    # Rejection funnel: how many symbols failed each condition this cycle
+    funnel = Counter()
+    signals = 0
 
     closed_positions = await asyncio.to_thread(check_open_positions, exchange)
     if closed_positions and BOT_USER_ID:
@@ -21,62 +41,86 @@ async def run_analysis_cycle(exchange):
 
     symbols = await asyncio.to_thread(get_top_volume_symbols, exchange, TOP_N_COINS_BY_VOLUME)
     if not symbols:
+        logger.warning("Cycle summary: no symbols fetched, scan skipped (closed=%d)", len(closed_positions))
         return
 
     for symbol in symbols:
-        if await asyncio.to_thread(get_open_forecast, symbol):
-            continue
-
         ohlcv_data = await asyncio.to_thread(fetch_ohlcv, exchange, symbol, DEFAULT_TIMEFRAME, 200)
         if ohlcv_data is None:
+            funnel['fetch_error'] += 1
             continue
 
-        data = await asyncio.to_thread(add_indicators, ohlcv_data)
+        data = await asyncio.to_thread(add_indicators, ohlcv_data, symbol, DEFAULT_TIMEFRAME)
 
         # Генерация сигнала
-        forecast = await asyncio.to_thread(check_long_signal, data, symbol, DEFAULT_TIMEFRAME)
-        if forecast:
-            print(f"✅ New signal found for {symbol}!")
+        forecast = await asyncio.to_thread(check_long_signal, data, symbol, DEFAULT_TIMEFRAME, funnel)
+        if forecast and not await asyncio.to_thread(is_signal_open, forecast):
+            logger.info("New signal: symbol=%s id=%s entry=%s", symbol, forecast.forecast_id, forecast.entry_price)
+            signals += 1
             await asyncio.to_thread(add_open_forecast, forecast)
+            track_forecast(forecast)
             if BOT_USER_ID:
-                msg = format_signal_message(forecast)
-                await send_message(BOT_USER_ID, msg)
-
-    print("Analysis cycle finished.")
+                try:
+                    chart = await get_chart(symbol, DEFAULT_TIMEFRAME, data, forecast)
+                except Exception:
+                    # A chart is nice to have; the signal must go out regardless
+                    # (get_chart already logged the traceback)
+                    logger.warning("Sending signal for %s without a chart", symbol)
+                    chart = None
+                await send_signal(BOT_USER_ID, forecast, chart)
+
+    logger.info(
+        "Cycle summary: symbols=%d signals=%d closed=%d fetch_errors=%d insufficient_data=%d "
+        "fail_trend=%d fail_crossover=%d fail_rsi=%d fail_atr=%d duration=%.1fs",
+        len(symbols), signals, len(closed_positions), funnel['fetch_error'], funnel['insufficient_data'],
+        funnel['trend'], funnel['crossover'], funnel['rsi'], funnel['atr'],
+        time.perf_counter() - started,
+    )
 
 # --- Периодический запуск через schedule ---
 async def scheduler_loop(exchange):
-    schedule.every().hour.at(":01").do(lambda: asyncio.create_task(run_analysis_cycle(exchange)))
+    schedule.every().hour.at(":01").do(lambda: _spawn(run_analysis_cycle(exchange)))
     while True:
         schedule.run_pending()
         await asyncio.sleep(1)
 
-# --- Главная функция ---
-async def main():
-    print("Initializing exchange...")
-    exchange = get_exchange("binance")
+# --- Тёплый старт: восстановление кэшей и биржа в фоне ---
+async def warm_start():
+    try:
+        await asyncio.to_thread(restore_state)
 
-    if not exchange:
-        print("Exchange init error")
-        return
+        logger.info("Initializing exchange...")
+        exchange = await asyncio.to_thread(get_exchange, EXCHANGE_ID)
+        set_exchange(exchange)
 
-    # --- ВАЖНО: первый анализ в фоне, не блокирует polling ---
-    print("Scheduling first analysis...")
-    asyncio.create_task(run_analysis_cycle(exchange))
+        # Запускаем внутренний цикл планировщика (ежечасный запуск)
+        _spawn(scheduler_loop(exchange))
 
-    # --- Настройка ежечасного запуска ---
-    schedule.every().hour.at(":01").do(
-        lambda: asyncio.create_task(run_analysis_cycle(exchange))
-    )
+        await run_analysis_cycle(exchange)
+    except Exception:
+        logger.exception("Startup failed: scanner and scheduler are not running")
 
-    # Запускаем внутренний цикл планировщика
-    asyncio.create_task(scheduler_loop(exchange))
+# --- Главная функция ---
+async def main():
+    # --- ВАЖНО: ccxt/pandas грузятся в фоне, не блокируют polling ---
+    _spawn(warm_start())
 
-    print("Starting bot polling...")
-    await dp.start_polling(bot)
+    logger.info("Starting bot polling...")
+    try:
+        await dp.start_polling(bot)
+    finally:
+        try:
+            save_state()
+        except Exception:
+            logger.exception("Could not save state snapshot")
+        shutdown_chart_pool()
 
 if __name__ == "__main__":
+    log_listener = setup_logging()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        print("\nBot stopped by user.")
+        logger.info("Bot stopped by user.")
+    finally:
+        # Flush queued records before exit
+        log_listener.stop()
@@ -0,0 +1,45 @@
+import asyncio
+from dataclasses import dataclass
+from modules.database import get_all_open_forecasts, get_history_array, get_db_version
+
+@dataclass(frozen=True, slots=True)
+class Snapshot:
+    """Read-only view of the database served to bot commands."""
+    version: int
+    open_forecasts: tuple
+    total: int
+    wins: int
+    losses: int
+
+_snapshot = None
+_refresh_lock = asyncio.Lock()
+
+def _build_snapshot(version):
+    import numpy as np
+
+    open_forecasts = sorted(get_all_open_forecasts().values(), key=lambda f: f.created_at, reverse=True)
+    history = get_history_array()
+    return Snapshot(
+        version=version,
+        open_forecasts=tuple(open_forecasts),
+        total=len(history),
+        wins=int(np.count_nonzero(np.isin(history['outcome'], ('HIT_TP1', 'HIT_TP2')))),
+        losses=int(np.count_nonzero(history['outcome'] == 'HIT_SL')),
+    )
+
+async def get_snapshot():
+    """
+    Returns the current snapshot. It is rebuilt off the event loop only when
+    the database version has changed; otherwise no I/O happens at all.
+    """
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == get_db_version():
+        return snapshot
+
+    async with _refresh_lock:
+        # Another handler may have refreshed it while we were waiting
+        version = get_db_version()
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = await asyncio.to_thread(_build_snapshot, version)
+        return _snapshot
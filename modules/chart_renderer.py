@@ -0,0 +1,155 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from config import CHART_CACHE_MAX_BYTES, CHART_CANDLES, CHART_WORKERS
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_cache = OrderedDict()
+_cache_bytes = 0
+# key -> Future of a render in progress, so concurrent requests share it
+_in_flight = {}
+
+
+def render_chart(candles, symbol, timeframe, levels):
+    """
+    Renders candles with EMA12/EMA50, RSI and ATR panels as a PNG.
+    Runs inside a worker process, so it only takes picklable arguments.
+
+    :param candles: A DataFrame with OHLCV and indicator columns.
+    :param symbol: The trading pair symbol, used in the title.
+    :param timeframe: The candle timeframe, used in the title.
+    :param levels: A dict of label -> price drawn as horizontal lines (may be empty).
+    :return: PNG image bytes.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    x = np.arange(len(candles))
+    up = candles['close'] >= candles['open']
+    colors = np.where(up, '#26a69a', '#ef5350')
+
+    fig, (ax_price, ax_rsi, ax_atr) = plt.subplots(
+        3, 1, figsize=(10, 7), sharex=True, gridspec_kw={'height_ratios': [3, 1, 1]}
+    )
+
+    # --- Свечи и EMA ---
+    ax_price.vlines(x, candles['low'], candles['high'], colors=colors, linewidth=0.8)
+    ax_price.bar(x, (candles['close'] - candles['open']).abs(), bottom=candles[['open', 'close']].min(axis=1),
+                 color=colors, width=0.6)
+    ax_price.plot(x, candles['EMA_12'], color='#ff9800', linewidth=1, label='EMA12')
+    ax_price.plot(x, candles['EMA_50'], color='#2196f3', linewidth=1, label='EMA50')
+    level_colors = {'Entry': '#607d8b', 'SL': '#d32f2f', 'TP1': '#388e3c', 'TP2': '#1b5e20'}
+    for label, price in levels.items():
+        ax_price.axhline(price, color=level_colors.get(label, 'black'), linestyle='--', linewidth=0.9)
+        ax_price.annotate(f"{label} {price:.6g}", (x[-1], price), xytext=(4, 0), textcoords='offset points',
+                          va='center', fontsize=7, color=level_colors.get(label, 'black'))
+    ax_price.set_title(f"{symbol} · {timeframe}")
+    ax_price.legend(loc='upper left', fontsize=7)
+    ax_price.grid(alpha=0.2)
+
+    # --- RSI ---
+    ax_rsi.plot(x, candles['RSI_14'], color='#7e57c2', linewidth=1)
+    ax_rsi.axhspan(40, 70, color='#7e57c2', alpha=0.08)
+    ax_rsi.set_ylim(0, 100)
+    ax_rsi.set_ylabel('RSI 14', fontsize=8)
+    ax_rsi.grid(alpha=0.2)
+
+    # --- ATR ---
+    ax_atr.plot(x, candles['ATRr_14'], color='#795548', linewidth=1)
+    ax_atr.set_ylabel('ATR 14', fontsize=8)
+    ax_atr.grid(alpha=0.2)
+
+    ticks = x[::max(1, len(x) // 6)]
+    ax_atr.set_xticks(ticks)
+    ax_atr.set_xticklabels([candles.index[i].strftime('%m-%d %H:%M') for i in ticks], fontsize=7)
+
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=100)
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # 'spawn' keeps workers free of the bot's threads and event loop
+        _executor = ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+def _cache_put(key, image):
+    """Stores a rendered image and evicts least recently used ones over the size budget."""
+    global _cache_bytes
+    if key in _cache:
+        _cache_bytes -= len(_cache.pop(key))
+    _cache[key] = image
+    _cache_bytes += len(image)
+    while _cache_bytes > CHART_CACHE_MAX_BYTES and len(_cache) > 1:
+        _, evicted = _cache.popitem(last=False)
+        _cache_bytes -= len(evicted)
+
+
+def forecast_levels(forecast):
+    """Returns the price levels of a forecast to draw on its chart."""
+    if forecast is None:
+        return {}
+    return {
+        'Entry': forecast.entry_price,
+        'SL': forecast.stop_loss_price,
+        'TP1': forecast.take_profit1_price,
+        'TP2': forecast.take_profit2_price,
+    }
+
+
+async def get_chart(symbol, timeframe, df, forecast=None):
+    """
+    Returns a PNG chart, rendering it in the process pool on a cache miss.
+    Images are cached by (symbol, timeframe, last candle timestamp and prices, forecast_id).
+
+    :param df: A DataFrame with OHLCV and indicator columns.
+    :param forecast: An optional Forecast whose entry/SL/TP levels are drawn.
+    :return: PNG image bytes.
+    """
+    # The last candle may still be forming, so its prices are part of the key
+    last = (df['high'].iat[-1], df['low'].iat[-1], df['close'].iat[-1])
+    key = (symbol, timeframe, df.index[-1], last, forecast.forecast_id if forecast else None)
+    image = _cache.get(key)
+    if image is not None:
+        _cache.move_to_end(key)
+        return image
+
+    future = _in_flight.get(key)
+    if future is None:
+        loop = asyncio.get_running_loop()
+        candles = df[['open', 'high', 'low', 'close', 'EMA_12', 'EMA_50', 'RSI_14', 'ATRr_14']].tail(CHART_CANDLES)
+        future = loop.run_in_executor(
+            _get_executor(), render_chart, candles, symbol, timeframe, forecast_levels(forecast)
+        )
+        _in_flight[key] = future
+        try:
+            image = await future
+            _cache_put(key, image)
+        except Exception:
+            logger.exception("Chart rendering failed for %s %s", symbol, timeframe)
+            raise
+        finally:
+            del _in_flight[key]
+        return image
+
+    return await future
+
+
+def shutdown_chart_pool():
+    """Stops the worker processes, if any were started."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
@@ -1,53 +1,115 @@
-import ccxt
-import pandas as pd
-from datetime import datetime, timedelta
+import logging
+import time
+from threading import Lock
+from config import EXCHANGE_MODE, CASSETTE_FILE, REPLAY_SPEED
+
+logger = logging.getLogger(__name__)
+
+# ccxt and pandas are imported inside the functions that need them, so the
+# bot can start polling before these heavy modules are loaded.
+
+# --- Кэш свечей ---
+# (symbol, timeframe) -> DataFrame with raw OHLCV columns only
+_candle_cache = {}
+candle_lock = Lock()
+
+# symbol -> last seen price, updated by every candle and ticker fetch
+_last_prices = {}
 
 def get_exchange(exchange_id):
-    """Initializes and returns an exchange instance."""
+    """
+    Initializes and returns an exchange instance.
+    Depending on EXCHANGE_MODE the instance records or replays a cassette.
+    """
+    from modules.exchange_recorder import RecordingExchange, ReplayExchange
+
+    if EXCHANGE_MODE == 'replay':
+        return ReplayExchange(CASSETTE_FILE, speed=REPLAY_SPEED)
+
+    import ccxt
     exchange = getattr(ccxt, exchange_id)()
+    if EXCHANGE_MODE == 'record':
+        return RecordingExchange(exchange, CASSETTE_FILE)
     return exchange
 
+def _to_frame(ohlcv):
+    import pandas as pd
+
+    # Convert to pandas DataFrame
+    df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+
+    # Convert timestamp to datetime
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+
+    # Set timestamp as index
+    df.set_index('timestamp', inplace=True)
+
+    return df
+
 def fetch_ohlcv(exchange, symbol, timeframe='1h', limit=100):
     """
     Fetches historical OHLCV data for a given symbol and timeframe.
 
+    Candles are cached per (symbol, timeframe). When the cache already holds
+    enough history, only the candles since the last cached one are requested.
+
     :param exchange: The ccxt exchange instance.
     :param symbol: The symbol to fetch data for (e.g., 'BTC/USDT').
     :param timeframe: The timeframe to use (e.g., '1h', '4h', '1d').
     :param limit: The number of candles to fetch.
     :return: A pandas DataFrame with OHLCV data, or None if fetching fails.
     """
+    import ccxt
+    import pandas as pd
+
     try:
         if not exchange.has['fetchOHLCV']:
-            print(f"Exchange {exchange.id} does not support fetching OHLCV data.")
+            logger.warning("Exchange %s does not support fetching OHLCV data.", exchange.id)
             return None
 
+        with candle_lock:
+            cached = _candle_cache.get((symbol, timeframe))
+
+        since = None
+        if cached is not None and len(cached) >= limit:
+            last_ms = int(cached.index[-1].value // 1_000_000)
+            period_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+            # Only go incremental if the candles since the cached one fit into a single request
+            if (time.time() * 1000 - last_ms) // period_ms + 1 <= limit:
+                since = last_ms
+
         # Fetch the OHLCV data
-        ohlcv = exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+        if since is None:
+            ohlcv = exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+        else:
+            ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
 
         if not ohlcv:
-            print(f"No data returned for {symbol} on timeframe {timeframe}")
+            logger.warning("No data returned for %s on timeframe %s", symbol, timeframe)
             return None
 
-        # Convert to pandas DataFrame
-        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        
-        # Convert timestamp to datetime
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        
-        # Set timestamp as index
-        df.set_index('timestamp', inplace=True)
-        
-        return df
+        df = _to_frame(ohlcv)
+
+        if cached is not None and df.index[0] <= cached.index[-1]:
+            # Fresh candles overlap the cache: the last cached one may have been
+            # incomplete, so the fetched rows replace it
+            df = pd.concat([cached[cached.index < df.index[0]], df])
+            df = df.tail(max(limit, len(cached)))
+
+        with candle_lock:
+            _candle_cache[(symbol, timeframe)] = df
+        _last_prices[symbol] = float(df['close'].iat[-1])
+
+        return df.tail(limit).copy()
 
     except ccxt.NetworkError as e:
-        print(f"Network error while fetching {symbol}: {e}")
+        logger.warning("Network error while fetching %s: %s", symbol, e)
         return None
     except ccxt.ExchangeError as e:
-        print(f"Exchange error while fetching {symbol}: {e}")
+        logger.warning("Exchange error while fetching %s: %s", symbol, e)
         return None
     except Exception as e:
-        print(f"An unexpected error occurred while fetching {symbol}: {e}")
+        logger.exception("An unexpected error occurred while fetching %s", symbol)
         return None
 
 def get_top_volume_symbols(exchange, n=20):
@@ -58,14 +120,20 @@ def get_top_volume_symbols(exchange, n=20):
     :param n: The number of top symbols to return.
     :return: A list of symbols, or None.
     """
+    import ccxt
+
     try:
         if not exchange.has['fetchTickers']:
-            print(f"Exchange {exchange.id} does not support fetching tickers.")
+            logger.warning("Exchange %s does not support fetching tickers.", exchange.id)
             return None
         
         # Fetch all tickers
         tickers = exchange.fetch_tickers()
         
+        for symbol, ticker in tickers.items():
+            if ticker.get('last') is not None:
+                _last_prices[symbol] = ticker['last']
+
         # Filter for USDT pairs and sort by 24h volume
         usdt_tickers = {
             symbol: ticker for symbol, ticker in tickers.items()
@@ -87,15 +155,31 @@ def get_top_volume_symbols(exchange, n=20):
         return [t["symbol"] for t in sorted_tickers]
 
     except ccxt.NetworkError as e:
-        print(f"Network error while fetching tickers: {e}")
+        logger.warning("Network error while fetching tickers: %s", e)
         return None
     except ccxt.ExchangeError as e:
-        print(f"Exchange error while fetching tickers: {e}")
+        logger.warning("Exchange error while fetching tickers: %s", e)
         return None
     except Exception as e:
-        print(f"An unexpected error occurred while fetching tickers: {e}")
+        logger.exception("An unexpected error occurred while fetching tickers")
         return None
 
+def get_cached_price(symbol):
+    """Returns the last price seen for a symbol without a network call, or None."""
+    return _last_prices.get(symbol)
+
+def get_candle_state():
+    """Returns a shallow copy of the candle cache for snapshotting."""
+    with candle_lock:
+        return dict(_candle_cache)
+
+def load_candle_state(state):
+    """Restores candles saved by get_candle_state."""
+    # Prices are deliberately not seeded from the snapshot: its closes may be
+    # days old and must not be shown as live until a fresh fetch happens
+    with candle_lock:
+        _candle_cache.update(state)
+
 if __name__ == '__main__':
     # Example usage:
     from config import EXCHANGE_ID, TOP_N_COINS_BY_VOLUME
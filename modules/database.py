@@ -1,10 +1,15 @@
 import json
 import os
+from datetime import datetime
 from threading import Lock
+from modules.forecast import Forecast, RawSignal, history_array
 
 DB_FILE = 'db.json'
 db_lock = Lock()
 
+# Incremented on every save, so readers can tell when derived state is stale
+_db_version = 0
+
 def load_db():
     """Loads the database from the JSON file."""
     with db_lock:
@@ -18,9 +23,27 @@ def load_db():
 
 def save_db(data):
     """Saves the given data to the JSON database file."""
+    global _db_version
     with db_lock:
         with open(DB_FILE, 'w') as f:
-            json.dump(data, f, indent=4, default=str)
+            # Records are serialized through an explicit schema, so no default=str fallback
+            json.dump(data, f, separators=(',', ':'))
+        _db_version += 1
+
+def get_db_version():
+    """Returns a counter that changes whenever the database is saved."""
+    return _db_version
+
+def _open_forecasts(db):
+    """
+    Returns the open forecasts of `db` keyed by forecast_id.
+    Older databases keyed them by symbol, so they are re-keyed on the fly.
+    """
+    open_forecasts = db.setdefault('open_forecasts', {})
+    if any(key != f['forecast_id'] for key, f in open_forecasts.items()):
+        open_forecasts = {f['forecast_id']: f for f in open_forecasts.values()}
+        db['open_forecasts'] = open_forecasts
+    return open_forecasts
 
 def get_user_profile(user_id):
     """Retrieves a user's profile."""
@@ -38,66 +61,79 @@ def update_user_profile(user_id, settings):
 def add_open_forecast(forecast):
     """Adds a new forecast to the open forecasts list."""
     db = load_db()
-    symbol = forecast['symbol']
-    if 'open_forecasts' not in db:
-        db['open_forecasts'] = {}
-    db['open_forecasts'][symbol] = forecast
+    _open_forecasts(db)[forecast.forecast_id] = forecast.to_dict()
     save_db(db)
 
-def get_open_forecast(symbol):
+def get_open_forecast(forecast_id):
     """
-    Checks if there is an open forecast for a given symbol.
-    Returns the forecast if it exists, otherwise None.
+    Returns the open Forecast with the given id, or None.
     """
     db = load_db()
-    return db.get('open_forecasts', {}).get(symbol)
+    data = _open_forecasts(db).get(forecast_id)
+    return Forecast.from_dict(data) if data else None
 
-def close_forecast(symbol, outcome_data):
-    """Moves a forecast from 'open' to 'history' and records the outcome."""
+def is_signal_open(forecast):
+    """
+    Checks if a forecast for the same symbol, timeframe and signal candle
+    is already open, so one candle is never reported twice.
+    """
     db = load_db()
-    open_forecasts = db.get('open_forecasts', {})
-    
-    if symbol in open_forecasts:
-        forecast_to_close = open_forecasts.pop(symbol)
-        
-        # Add outcome data
-        forecast_to_close.update(outcome_data)
-        forecast_to_close['status'] = 'closed'
-        
-        if 'history' not in db:
-            db['history'] = []
-            
-        db['history'].append(forecast_to_close)
+    timestamp = forecast.raw_signal.timestamp
+    for data in _open_forecasts(db).values():
+        if data['symbol'] != forecast.symbol or data['timeframe'] != forecast.timeframe:
+            continue
+        open_forecast = Forecast.from_dict(data)
+        if open_forecast.raw_signal and open_forecast.raw_signal.timestamp == timestamp:
+            return True
+    return False
+
+def close_forecasts(outcomes, hit_at):
+    """
+    Moves forecasts from 'open' to 'history' in a single save.
+
+    :param outcomes: A dict of forecast_id -> (outcome, hit_price).
+    :param hit_at: The time the levels were hit.
+    :return: A list of the closed Forecast records.
+    """
+    db = load_db()
+    open_forecasts = _open_forecasts(db)
+    if 'history' not in db:
+        db['history'] = []
+
+    closed = []
+    for forecast_id, (outcome, hit_price) in outcomes.items():
+        if forecast_id not in open_forecasts:
+            continue
+        forecast_to_close = Forecast.from_dict(open_forecasts.pop(forecast_id))
+        forecast_to_close.close(outcome, hit_price, hit_at)
+        db['history'].append(forecast_to_close.to_dict())
+        closed.append(forecast_to_close)
+
+    if closed:
         save_db(db)
-        return forecast_to_close
-    return None
+    return closed
+
+def close_forecast(forecast_id, outcome, hit_price, hit_at):
+    """Moves a forecast from 'open' to 'history' and records the outcome."""
+    closed = close_forecasts({forecast_id: (outcome, hit_price)}, hit_at)
+    return closed[0] if closed else None
 
 
 def get_all_forecasts():
     """
-    Возвращает все прогнозы из базы (history) с преобразованием дат.
+    Возвращает все прогнозы из базы (history) как записи Forecast.
     """
     db = load_db()
-    forecasts = db.get('history', [])
-
-    for f in forecasts:
-        if "created_at" in f and isinstance(f["created_at"], str):
-            try:
-                f["created_at"] = datetime.fromisoformat(f["created_at"])
-            except Exception:
-                pass
-        if "hit_at" in f and isinstance(f["hit_at"], str):
-            try:
-                f["hit_at"] = datetime.fromisoformat(f["hit_at"])
-            except Exception:
-                pass
-
-    return forecasts
+    return [Forecast.from_dict(f) for f in db.get('history', [])]
+
+def get_history_array():
+    """Returns closed forecasts as a NumPy structured array (see HISTORY_FIELDS)."""
+    return history_array(get_all_forecasts())
 
 def get_all_open_forecasts():
-    """Returns a dictionary of all open forecasts."""
+    """Returns a dictionary of all open forecasts keyed by forecast_id."""
     db = load_db()
-    return db.get('open_forecasts', {})
+    return {forecast_id: Forecast.from_dict(f) for forecast_id, f in _open_forecasts(db).items()}
 
 if __name__ == '__main__':
     # Example usage and testing of the database module
@@ -120,34 +156,63 @@ if __name__ == '__main__':
     assert profile['balance'] == 1000
     
     # 3. Add a dummy forecast
-    dummy_forecast = {
-        'forecast_id': 'dummy-uuid-1',
-        'symbol': 'BTC/USDT',
-        'direction': 'LONG',
-        'entry_price': 65000
-    }
+    dummy_forecast = Forecast(
+        forecast_id='dummy-uuid-1',
+        symbol='BTC/USDT',
+        direction='LONG',
+        timeframe='1h',
+        entry_price=65000,
+        stop_loss_price=64000,
+        take_profit1_price=66500,
+        take_profit2_price=68000,
+        sl_method='percentage',
+        created_at=datetime.utcnow()
+    )
     add_open_forecast(dummy_forecast)
     print("Added open forecast for BTC/USDT.")
     
     # 4. Check for the open forecast
-    open_f = get_open_forecast('BTC/USDT')
+    open_f = get_open_forecast('dummy-uuid-1')
     print("Retrieved open forecast:", open_f)
-    assert open_f['entry_price'] == 65000
+    assert open_f.entry_price == 65000
+
+    # 4b. A second signal on the same candle is detected, a new candle is not
+    signal_candle = datetime(2024, 1, 1, 10)
+    stacked = Forecast(
+        forecast_id='dummy-uuid-2',
+        symbol='BTC/USDT',
+        direction='LONG',
+        timeframe='1h',
+        entry_price=65100,
+        stop_loss_price=64100,
+        take_profit1_price=66600,
+        take_profit2_price=68100,
+        sl_method='percentage',
+        created_at=datetime.utcnow(),
+        raw_signal=RawSignal(ema12=1, ema50=1, rsi14=50, atr14=1, close=65100, timestamp=signal_candle)
+    )
+    assert not is_signal_open(stacked)
+    add_open_forecast(stacked)
+    assert is_signal_open(stacked)
+    stacked.raw_signal.timestamp = datetime(2024, 1, 1, 11)
+    assert not is_signal_open(stacked)
+    print("Stacked a second open forecast on BTC/USDT.")
+
+    # 4c. Close it with a batch call; unknown ids are ignored
+    batch = close_forecasts({'dummy-uuid-2': ('HIT_SL', 64100), 'missing': ('HIT_TP1', 1)}, datetime.utcnow())
+    assert [f.forecast_id for f in batch] == ['dummy-uuid-2']
+    assert batch[0].is_success is False
     
     # 5. Close the forecast
-    outcome = {
-        'outcome': 'HIT_TP1',
-        'hit_price': 66500,
-        'is_success': True
-    }
-    closed_f = close_forecast('BTC/USDT', outcome)
+    closed_f = close_forecast('dummy-uuid-1', 'HIT_TP1', 66500, datetime.utcnow())
     print("Closed forecast:", closed_f)
     
     # 6. Verify it's in history and not in open
     db_state = load_db()
-    assert 'BTC/USDT' not in db_state['open_forecasts']
-    assert len(db_state['history']) == 1
-    assert db_state['history'][0]['outcome'] == 'HIT_TP1'
+    assert 'dummy-uuid-1' not in db_state['open_forecasts']
+    assert db_state['open_forecasts'] == {}
+    assert len(db_state['history']) == 2
+    assert db_state['history'][1]['outcome'] == 'HIT_TP1'
     print("--- Database Module Test Passed ---")
 
     # Clean up the test db file
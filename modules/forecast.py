@@ -0,0 +1,190 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_ms(value):
+    """Converts a naive UTC datetime (or pandas Timestamp) to epoch milliseconds."""
+    if value is None:
+        return None
+    return int((value - _EPOCH) / timedelta(milliseconds=1))
+
+
+def _from_ms(value):
+    """
+    Converts epoch milliseconds back to a naive UTC datetime.
+    ISO strings written by older versions of the database are accepted too.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return _EPOCH + timedelta(milliseconds=value)
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+def _plain(value):
+    """Unwraps numpy scalars to the matching Python type; ints stay ints."""
+    return value.item() if hasattr(value, 'item') else value
+
+
+@dataclass(slots=True)
+class RawSignal:
+    """Indicator values of the candle that produced a signal."""
+    ema12: float
+    ema50: float
+    rsi14: float
+    atr14: float
+    close: float
+    timestamp: datetime
+
+    def to_dict(self):
+        return {
+            'ema12': self.ema12,
+            'ema50': self.ema50,
+            'rsi14': self.rsi14,
+            'atr14': self.atr14,
+            'close': self.close,
+            'timestamp': _to_ms(self.timestamp),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            ema12=float(data['ema12']),
+            ema50=float(data['ema50']),
+            rsi14=float(data['rsi14']),
+            atr14=float(data['atr14']),
+            close=float(data['close']),
+            timestamp=_from_ms(data['timestamp']),
+        )
+
+
+@dataclass(slots=True)
+class Forecast:
+    """An open or closed forecast. Outcome fields stay None while it is open."""
+    forecast_id: str
+    symbol: str
+    direction: str
+    timeframe: str
+    entry_price: float
+    stop_loss_price: float
+    take_profit1_price: float
+    take_profit2_price: float
+    sl_method: str
+    created_at: datetime
+    sl_params: dict = field(default_factory=dict)
+    status: str = 'open'
+    raw_signal: RawSignal = None
+    hit_price: float = None
+    hit_at: datetime = None
+    duration_seconds: float = None
+    outcome: str = None
+    is_success: bool = None
+
+    def close(self, outcome, hit_price, hit_at):
+        """Records the outcome and marks the forecast as closed."""
+        self.outcome = outcome
+        self.hit_price = float(hit_price)
+        self.hit_at = hit_at
+        self.duration_seconds = (hit_at - self.created_at).total_seconds()
+        self.is_success = outcome != 'HIT_SL'
+        self.status = 'closed'
+
+    def to_dict(self):
+        """Serializes to JSON-safe primitives. Datetimes become epoch milliseconds."""
+        return {
+            'forecast_id': self.forecast_id,
+            'symbol': self.symbol,
+            'direction': self.direction,
+            'timeframe': self.timeframe,
+            'entry_price': self.entry_price,
+            'stop_loss_price': self.stop_loss_price,
+            'take_profit1_price': self.take_profit1_price,
+            'take_profit2_price': self.take_profit2_price,
+            'sl_method': self.sl_method,
+            'sl_params': {k: _plain(v) for k, v in self.sl_params.items()},
+            'created_at': _to_ms(self.created_at),
+            'status': self.status,
+            'raw_signal': self.raw_signal.to_dict() if self.raw_signal else None,
+            'hit_price': self.hit_price,
+            'hit_at': _to_ms(self.hit_at),
+            'duration_seconds': self.duration_seconds,
+            'outcome': self.outcome,
+            'is_success': self.is_success,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        raw_signal = data.get('raw_signal')
+        return cls(
+            forecast_id=data['forecast_id'],
+            symbol=data['symbol'],
+            direction=data['direction'],
+            timeframe=data['timeframe'],
+            entry_price=float(data['entry_price']),
+            stop_loss_price=float(data['stop_loss_price']),
+            take_profit1_price=float(data['take_profit1_price']),
+            take_profit2_price=float(data['take_profit2_price']),
+            sl_method=data.get('sl_method'),
+            sl_params=data.get('sl_params') or {},
+            created_at=_from_ms(data['created_at']),
+            status=data.get('status', 'open'),
+            raw_signal=RawSignal.from_dict(raw_signal) if raw_signal else None,
+            hit_price=_float(data.get('hit_price')),
+            hit_at=_from_ms(data.get('hit_at')),
+            duration_seconds=_float(data.get('duration_seconds')),
+            outcome=data.get('outcome'),
+            is_success=data.get('is_success'),
+        )
+
+
+# Columnar layout of closed forecasts for vectorized analytics
+HISTORY_FIELDS = [
+    ('symbol', 'U24'),
+    ('timeframe', 'U4'),
+    ('entry_price', 'f8'),
+    ('stop_loss_price', 'f8'),
+    ('take_profit1_price', 'f8'),
+    ('take_profit2_price', 'f8'),
+    ('hit_price', 'f8'),
+    ('created_at', 'datetime64[ms]'),
+    ('hit_at', 'datetime64[ms]'),
+    ('duration_seconds', 'f8'),
+    ('outcome', 'U8'),
+    ('is_success', '?'),
+]
+
+
+def history_array(forecasts):
+    """
+    Builds a NumPy structured array from closed forecasts.
+
+    :param forecasts: An iterable of closed Forecast records.
+    :return: A structured array with HISTORY_FIELDS as its dtype.
+    """
+    import numpy as np
+
+    nan = float('nan')
+    rows = [
+        (
+            f.symbol,
+            f.timeframe,
+            f.entry_price,
+            f.stop_loss_price,
+            f.take_profit1_price,
+            f.take_profit2_price,
+            nan if f.hit_price is None else f.hit_price,
+            f.created_at,
+            f.hit_at,
+            nan if f.duration_seconds is None else f.duration_seconds,
+            f.outcome or '',
+            bool(f.is_success),
+        )
+        for f in forecasts
+    ]
+    return np.array(rows, dtype=HISTORY_FIELDS)
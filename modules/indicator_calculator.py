@@ -1,26 +1,157 @@
-import pandas_ta as ta
+from collections import OrderedDict
+from threading import Lock
+from config import INDICATOR_CACHE_MAX_BYTES
 
-def add_indicators(df):
+# --- Реестр индикаторов ---
+# Each indicator is a node of a small dependency graph. `inputs` are either
+# OHLCV columns or names of other registered indicators; `params` are passed
+# to `func` and are part of the memoization key. A string `func` names a
+# pandas_ta function, which keeps pandas_ta out of the startup imports.
+INDICATORS = {}
+
+# Indicators computed by `add_indicators` when no explicit list is given.
+DEFAULT_INDICATORS = ('EMA_12', 'EMA_50', 'RSI_14', 'ATRr_14')
+
+_cache = OrderedDict()
+_cache_bytes = 0
+cache_lock = Lock()
+
+
+def register_indicator(name, func, inputs, **params):
+    """
+    Registers an indicator node in the graph.
+
+    :param name: The column name the result is stored under (e.g., 'EMA_12').
+    :param func: A callable taking the input series positionally and params as keywords,
+                 or the name of a pandas_ta function.
+    :param inputs: A tuple of OHLCV column names or other indicator names.
+    :param params: Keyword parameters for `func`.
+    """
+    INDICATORS[name] = {
+        'func': func,
+        'inputs': tuple(inputs),
+        'params': params,
+    }
+
+
+register_indicator('EMA_12', 'ema', ('close',), length=12)
+register_indicator('EMA_50', 'ema', ('close',), length=50)
+register_indicator('RSI_14', 'rsi', ('close',), length=14)
+register_indicator('ATRr_14', 'atr', ('high', 'low', 'close'), length=14)
+
+
+def _cache_key(name, symbol, timeframe, df):
+    """Builds the memoization key for one indicator on one candle window."""
+    spec = INDICATORS[name]
+    params = tuple(sorted(spec['params'].items()))
+    # The last candle may still be forming, so its prices are part of the key
+    last = (df['high'].iat[-1], df['low'].iat[-1], df['close'].iat[-1])
+    return (symbol, timeframe, df.index[-1], len(df), last, name, params)
+
+
+def _cache_get(key):
+    with cache_lock:
+        series = _cache.get(key)
+        if series is not None:
+            _cache.move_to_end(key)
+        return series
+
+
+def _cache_put(key, series):
+    """Stores a result and evicts least recently used entries over the memory budget."""
+    global _cache_bytes
+    size = int(series.memory_usage(deep=False))
+    with cache_lock:
+        if key in _cache:
+            _cache_bytes -= int(_cache.pop(key).memory_usage(deep=False))
+        _cache[key] = series
+        _cache_bytes += size
+        while _cache_bytes > INDICATOR_CACHE_MAX_BYTES and len(_cache) > 1:
+            _, evicted = _cache.popitem(last=False)
+            _cache_bytes -= int(evicted.memory_usage(deep=False))
+
+
+def clear_indicator_cache():
+    """Drops all memoized indicator results."""
+    global _cache_bytes
+    with cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
+
+
+def _resolve(name, df, symbol, timeframe, computed, visiting):
+    """Computes `name` and its missing dependencies, reusing memoized results."""
+    if name in computed:
+        return computed[name]
+    if name in df.columns:
+        return df[name]
+    if name not in INDICATORS:
+        raise ValueError(f"Unknown indicator or column: {name}")
+    if name in visiting:
+        raise ValueError(f"Circular indicator dependency at: {name}")
+
+    key = None
+    if symbol is not None:
+        key = _cache_key(name, symbol, timeframe, df)
+        series = _cache_get(key)
+        if series is not None:
+            computed[name] = series
+            return series
+
+    visiting.add(name)
+    spec = INDICATORS[name]
+    args = [_resolve(i, df, symbol, timeframe, computed, visiting) for i in spec['inputs']]
+    visiting.discard(name)
+
+    func = spec['func']
+    if isinstance(func, str):
+        import pandas_ta as ta
+        func = getattr(ta, func)
+
+    series = func(*args, **spec['params'])
+    if series is None:
+        import pandas as pd
+        # pandas_ta returns None when there are fewer candles than the period
+        series = pd.Series(float('nan'), index=df.index)
+    series = series.rename(name)
+    computed[name] = series
+    if key is not None:
+        _cache_put(key, series)
+    return series
+
+
+def add_indicators(df, symbol=None, timeframe=None, indicators=DEFAULT_INDICATORS):
     """
     Calculates and adds technical indicators to the DataFrame.
 
+    Results are memoized per (symbol, timeframe, last candle, params) when a
+    symbol is given, so only indicators missing from the cache are computed.
+
     :param df: A pandas DataFrame with OHLCV data.
+    :param symbol: The trading pair symbol, used as part of the cache key.
+    :param timeframe: The timeframe of the candles, used as part of the cache key.
+    :param indicators: Names of registered indicators to add.
     :return: The DataFrame with added indicator columns.
     """
     if df is None or df.empty:
         return df
 
-    # Calculate EMA (Exponential Moving Average)
-    df.ta.ema(length=12, append=True)
-    df.ta.ema(length=50, append=True)
+    computed = {}
+    for name in indicators:
+        series = _resolve(name, df, symbol, timeframe, computed, set())
+        df[name] = series
 
-    # Calculate RSI (Relative Strength Index)
-    df.ta.rsi(length=14, append=True)
+    return df
 
-    # Calculate ATR (Average True Range)
-    df.ta.atr(length=14, append=True)
+def get_indicator_state():
+    """Returns the memoized results, oldest first, for snapshotting."""
+    with cache_lock:
+        return list(_cache.items())
 
-    return df
+def load_indicator_state(entries):
+    """Restores results saved by get_indicator_state, respecting the memory budget."""
+    for key, series in entries:
+        _cache_put(key, series)
 
 if __name__ == '__main__':
     # Example usage:
@@ -32,14 +163,13 @@ if __name__ == '__main__':
     if exchange_instance:
         symbol = SYMBOLS[0]
         print(f"Fetching data for {symbol} to test indicators...")
-        
+
         # Fetch a larger dataset for accurate indicator calculation
         data = fetch_ohlcv(exchange_instance, symbol, timeframe='1h', limit=200)
-        
+
         if data is not None:
             # Add indicators
-            data_with_indicators = add_indicators(data)
-            
+            data_with_indicators = add_indicators(data, symbol, '1h')
+
             # Print the last 5 rows with the new indicators
             print(data_with_indicators.tail())
-
@@ -0,0 +1,151 @@
+from bisect import bisect_left, bisect_right
+
+
+class _SortedLevels:
+    """Price levels kept sorted, each tagged with the forecast it belongs to."""
+    __slots__ = ('prices', 'ids')
+
+    def __init__(self):
+        self.prices = []
+        self.ids = []
+
+    def add(self, price, forecast_id):
+        i = bisect_right(self.prices, price)
+        self.prices.insert(i, price)
+        self.ids.insert(i, forecast_id)
+
+    def remove(self, price, forecast_id):
+        i = bisect_left(self.prices, price)
+        while i < len(self.prices) and self.prices[i] == price:
+            if self.ids[i] == forecast_id:
+                del self.prices[i]
+                del self.ids[i]
+                return
+            i += 1
+
+    def at_or_above(self, price):
+        return self.ids[bisect_left(self.prices, price):]
+
+    def at_or_below(self, price):
+        return self.ids[:bisect_right(self.prices, price)]
+
+
+class PriceLevelIndex:
+    """
+    Per-(symbol, timeframe) sorted index of SL/TP levels of open LONG forecasts.
+
+    A candle's high/low (or a single price, with high == low) is resolved
+    with one range query per level type, so finding every triggered
+    position costs O(log n + k).
+    """
+
+    def __init__(self):
+        self._books = {}
+        self._forecasts = {}
+
+    def __len__(self):
+        return len(self._forecasts)
+
+    def keys(self):
+        """Returns the (symbol, timeframe) pairs that have open forecasts."""
+        return list(self._books)
+
+    def add(self, forecast):
+        if forecast.forecast_id in self._forecasts:
+            return
+        key = (forecast.symbol, forecast.timeframe)
+        book = self._books.get(key)
+        if book is None:
+            book = self._books[key] = {'sl': _SortedLevels(), 'tp1': _SortedLevels(), 'tp2': _SortedLevels()}
+        book['sl'].add(forecast.stop_loss_price, forecast.forecast_id)
+        book['tp1'].add(forecast.take_profit1_price, forecast.forecast_id)
+        book['tp2'].add(forecast.take_profit2_price, forecast.forecast_id)
+        self._forecasts[forecast.forecast_id] = forecast
+
+    def remove(self, forecast_id):
+        forecast = self._forecasts.pop(forecast_id, None)
+        if forecast is None:
+            return
+        key = (forecast.symbol, forecast.timeframe)
+        book = self._books[key]
+        book['sl'].remove(forecast.stop_loss_price, forecast_id)
+        book['tp1'].remove(forecast.take_profit1_price, forecast_id)
+        book['tp2'].remove(forecast.take_profit2_price, forecast_id)
+        if not book['sl'].prices:
+            del self._books[key]
+
+    def resolve(self, symbol, timeframe, high, low):
+        """
+        Finds every forecast whose level was touched by the given price range.
+
+        Priority per forecast is SL -> TP2 -> TP1, because a single candle
+        could hit multiple levels.
+
+        :return: A dict of forecast_id -> (outcome, hit_price).
+        """
+        book = self._books.get((symbol, timeframe))
+        if book is None:
+            return {}
+
+        hits = {}
+        for forecast_id in book['sl'].at_or_above(low):
+            hits[forecast_id] = ('HIT_SL', self._forecasts[forecast_id].stop_loss_price)
+        for forecast_id in book['tp2'].at_or_below(high):
+            if forecast_id not in hits:
+                hits[forecast_id] = ('HIT_TP2', self._forecasts[forecast_id].take_profit2_price)
+        for forecast_id in book['tp1'].at_or_below(high):
+            if forecast_id not in hits:
+                hits[forecast_id] = ('HIT_TP1', self._forecasts[forecast_id].take_profit1_price)
+        return hits
+
+
+if __name__ == '__main__':
+    # Example usage and self-check of the level index
+    from datetime import datetime
+    from modules.forecast import Forecast
+
+    def make(forecast_id, sl, tp1, tp2):
+        return Forecast(
+            forecast_id=forecast_id,
+            symbol='BTC/USDT',
+            direction='LONG',
+            timeframe='1h',
+            entry_price=100,
+            stop_loss_price=sl,
+            take_profit1_price=tp1,
+            take_profit2_price=tp2,
+            sl_method='percentage',
+            created_at=datetime.utcnow()
+        )
+
+    print("--- Testing Price Level Index ---")
+    index = PriceLevelIndex()
+    index.add(make('sl-and-tp2', 96, 104, 108))   # candle touches both: SL wins
+    index.add(make('tp2-and-tp1', 90, 104, 108))  # TP2 wins over TP1
+    index.add(make('tp1-only', 90, 104, 120))
+    index.add(make('untouched', 90, 130, 140))
+    index.add(make('tp1-only', 90, 104, 120))     # adding twice is a no-op
+    assert len(index) == 4
+
+    # 1. Priority SL -> TP2 -> TP1 on a candle with high=110, low=95
+    hits = index.resolve('BTC/USDT', '1h', high=110, low=95)
+    print("Hits:", hits)
+    assert hits == {
+        'sl-and-tp2': ('HIT_SL', 96),
+        'tp2-and-tp1': ('HIT_TP2', 108),
+        'tp1-only': ('HIT_TP1', 104),
+    }
+
+    # 2. Removing one of two forecasts sharing the same levels keeps the other
+    index.add(make('twin-a', 80, 150, 160))
+    index.add(make('twin-b', 80, 150, 160))
+    index.remove('twin-a')
+    hits = index.resolve('BTC/USDT', '1h', high=155, low=79)
+    assert 'twin-a' not in hits
+    assert hits['twin-b'] == ('HIT_SL', 80)
+
+    # 3. Removing everything drops the symbol from the index
+    for forecast_id in ('sl-and-tp2', 'tp2-and-tp1', 'tp1-only', 'untouched', 'twin-b'):
+        index.remove(forecast_id)
+    assert len(index) == 0 and index.keys() == []
+    print("--- Price Level Index Test Passed ---")
@@ -0,0 +1,28 @@
+import logging
+import logging.handlers
+import queue
+import sys
+from config import LOG_LEVEL
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+def setup_logging(level=LOG_LEVEL):
+    """
+    Routes all log records through a queue to a background writer thread,
+    so callers never block on stdout.
+
+    :param level: The root log level name (e.g., 'INFO', 'DEBUG').
+    :return: The started QueueListener; call stop() on shutdown to flush it.
+    """
+    log_queue = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(level)
+
+    listener.start()
+    return listener
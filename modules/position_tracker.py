@@ -1,79 +1,79 @@
+import logging
 from datetime import datetime
-from modules.database import get_all_open_forecasts, close_forecast
+from threading import Lock
+from modules.database import get_all_open_forecasts, close_forecasts
 from modules.data_fetcher import get_exchange, fetch_ohlcv
+from modules.level_index import PriceLevelIndex
+
+logger = logging.getLogger(__name__)
+
+# Open positions indexed by SL/TP levels. Built from the database on first use,
+# then kept up to date incrementally by track_forecast and the closures below.
+_index = None
+index_lock = Lock()
+
+def _ensure_index():
+    """Builds the level index from the database on first use."""
+    global _index
+    with index_lock:
+        if _index is None:
+            index = PriceLevelIndex()
+            for forecast in get_all_open_forecasts().values():
+                index.add(forecast)
+            _index = index
+        return _index
+
+def track_forecast(forecast):
+    """
+    Adds a newly opened forecast to the level index. Call after add_open_forecast.
+    If the index has not been built yet, the first build picks it up from the database.
+    """
+    with index_lock:
+        if _index is not None:
+            _index.add(forecast)
 
 def check_open_positions(exchange):
     """
-    Iterates through all open forecasts, checks their status, and closes them if SL or TP is hit.
+    Checks all open forecasts against the latest candle of their pair and closes
+    those whose SL or TP was hit.
 
     :param exchange: The ccxt exchange instance.
     :return: A list of closed positions with their outcomes.
     """
-    open_forecasts = get_all_open_forecasts()
-    if not open_forecasts:
+    index = _ensure_index()
+    with index_lock:
+        keys = index.keys()
+    if not keys:
         return []
 
-    closed_positions = []
+    outcomes = {}
+
+    for symbol, timeframe in keys:
+        # The last 2 candles: the one completed since the previous check and the one forming now
+        ohlcv = fetch_ohlcv(exchange, symbol, timeframe, limit=2)
 
-    for symbol, forecast in open_forecasts.items():
-        # Fetch the most recent candle to get the current price
-        # We only need the last 2 candles to get the high/low of the last completed one.
-        ohlcv = fetch_ohlcv(exchange, symbol, forecast['timeframe'], limit=2)
-        
         if ohlcv is None or ohlcv.empty:
-            print(f"Could not fetch price for {symbol} to check position.")
+            logger.warning("Could not fetch price for %s to check position.", symbol)
             continue
-            
-        # The latest price data is in the last row.
-        # We check the high and low of the candle to see if a level was wicked to.
-        last_candle = ohlcv.iloc[-1]
-        current_high = last_candle['high']
-        current_low = last_candle['low']
-
-        sl_price = forecast['stop_loss_price']
-        tp1_price = forecast['take_profit1_price']
-        tp2_price = forecast['take_profit2_price']
-        
-        outcome = None
-        hit_price = None
-        
-        # --- Check for SL or TP hit ---
-        # Priority: SL -> TP2 -> TP1 because a single candle could hit multiple levels.
-        
-        # 1. Check for Stop-Loss
-        if current_low <= sl_price:
-            outcome = 'HIT_SL'
-            hit_price = sl_price
-            is_success = False
-        
-        # 2. Check for Take-Profit 2
-        elif current_high >= tp2_price:
-            outcome = 'HIT_TP2'
-            hit_price = tp2_price
-            is_success = True
-            
-        # 3. Check for Take-Profit 1
-        elif current_high >= tp1_price:
-            outcome = 'HIT_TP1'
-            hit_price = tp1_price
-            is_success = True
-
-        if outcome:
-            duration = (datetime.utcnow() - datetime.fromisoformat(forecast['created_at'])).total_seconds()
-            
-            outcome_data = {
-                'hit_price': hit_price,
-                'hit_at': datetime.utcnow(),
-                'duration_seconds': duration,
-                'outcome': outcome,
-                'is_success': is_success
-            }
-            
-            closed_forecast = close_forecast(symbol, outcome_data)
-            
-            if closed_forecast:
-                print(f"✅ Position Closed: {symbol} | Outcome: {outcome} at {hit_price}")
-                closed_positions.append(closed_forecast)
+
+        # Check each candle's high and low, oldest first, to see if a level was wicked to.
+        # A position keeps the outcome of the first candle that hit it.
+        with index_lock:
+            for _, candle in ohlcv.iterrows():
+                for forecast_id, hit in index.resolve(symbol, timeframe, candle['high'], candle['low']).items():
+                    outcomes.setdefault(forecast_id, hit)
+
+    if not outcomes:
+        return []
+
+    closed_positions = close_forecasts(outcomes, datetime.utcnow())
+    with index_lock:
+        # Forecasts missing from the database were already closed elsewhere, so drop them all
+        for forecast_id in outcomes:
+            index.remove(forecast_id)
+    for closed_forecast in closed_positions:
+        logger.info("Position closed: symbol=%s id=%s outcome=%s hit_price=%s",
+                    closed_forecast.symbol, closed_forecast.forecast_id, closed_forecast.outcome, closed_forecast.hit_price)
 
     return closed_positions
 
@@ -82,6 +82,7 @@ if __name__ == '__main__':
     # Example Usage (requires a dummy forecast in the db)
     from config import EXCHANGE_ID
     from modules.database import add_open_forecast, load_db, save_db
+    from modules.forecast import Forecast
     import time
     import os
 
@@ -97,34 +98,36 @@ if __name__ == '__main__':
         current_price = real_data.iloc[-1]['close']
         
         # 2. Create a dummy forecast that will hit TP1 immediately
-        dummy_tp_forecast = {
-            'forecast_id': 'dummy-tp-test',
-            'symbol': 'BTC/USDT',
-            'direction': 'LONG',
-            'timeframe': '1h',
-            'created_at': datetime.utcnow().isoformat(),
-            'entry_price': current_price * 0.99, # Cheaper entry
-            'stop_loss_price': current_price * 0.98,
-            'take_profit1_price': current_price, # TP1 is current price
-            'take_profit2_price': current_price * 1.02,
-        }
+        dummy_tp_forecast = Forecast(
+            forecast_id='dummy-tp-test',
+            symbol='BTC/USDT',
+            direction='LONG',
+            timeframe='1h',
+            created_at=datetime.utcnow(),
+            entry_price=current_price * 0.99, # Cheaper entry
+            stop_loss_price=current_price * 0.98,
+            take_profit1_price=current_price, # TP1 is current price
+            take_profit2_price=current_price * 1.02,
+            sl_method='percentage',
+        )
         add_open_forecast(dummy_tp_forecast)
-        print(f"Added dummy forecast for BTC/USDT at entry: {dummy_tp_forecast['entry_price']:.2f}")
+        print(f"Added dummy forecast for BTC/USDT at entry: {dummy_tp_forecast.entry_price:.2f}")
 
         # 3. Create another dummy forecast that should not close
-        dummy_open_forecast = {
-            'forecast_id': 'dummy-open-test',
-            'symbol': 'ETH/USDT',
-            'direction': 'LONG',
-            'timeframe': '1h',
-            'created_at': datetime.utcnow().isoformat(),
-            'entry_price': 1000,
-            'stop_loss_price': 900,
-            'take_profit1_price': 1100,
-            'take_profit2_price': 1200,
-        }
+        dummy_open_forecast = Forecast(
+            forecast_id='dummy-open-test',
+            symbol='ETH/USDT',
+            direction='LONG',
+            timeframe='1h',
+            created_at=datetime.utcnow(),
+            entry_price=1000,
+            stop_loss_price=900,
+            take_profit1_price=1100,
+            take_profit2_price=1200,
+            sl_method='percentage',
+        )
         add_open_forecast(dummy_open_forecast)
-        print(f"Added dummy forecast for ETH/USDT at entry: {dummy_open_forecast['entry_price']:.2f}")
+        print(f"Added dummy forecast for ETH/USDT at entry: {dummy_open_forecast.entry_price:.2f}")
         
         print("\n--- Running Position Tracker ---")
         time.sleep(1) # Ensure we don't hit rate limits
@@ -135,9 +138,9 @@ if __name__ == '__main__':
         # 5. Verify results
         db = load_db()
         assert len(closed_pos) == 1
-        assert closed_pos[0]['outcome'] == 'HIT_TP1'
-        assert 'ETH/USDT' in db['open_forecasts']
-        assert 'BTC/USDT' not in db['open_forecasts']
+        assert closed_pos[0].outcome == 'HIT_TP1'
+        assert 'dummy-open-test' in db['open_forecasts']
+        assert 'dummy-tp-test' not in db['open_forecasts']
         print("--- Position Tracker Test Passed ---")
 
         # Clean up
@@ -1,5 +1,7 @@
+import logging
 from datetime import datetime
 import uuid
+from modules.forecast import Forecast, RawSignal
 from config import (
     DEFAULT_SL_METHOD, 
     DEFAULT_ATR_MULTIPLIER, 
@@ -9,7 +11,9 @@ from config import (
     DEFAULT_RISK_REWARD_TP2
 )
 
-def check_long_signal(df, symbol, timeframe):
+logger = logging.getLogger(__name__)
+
+def check_long_signal(df, symbol, timeframe, funnel=None):
     """
     Checks if the conditions for a LONG signal are met.
     If so, calculates SL/TP and returns a structured forecast.
@@ -17,10 +21,14 @@ def check_long_signal(df, symbol, timeframe):
     :param df: DataFrame with OHLCV data and indicators.
     :param symbol: The trading pair symbol.
     :param timeframe: The timeframe for the signal.
-    :return: A dictionary representing the forecast, or None.
+    :param funnel: Optional Counter; each failed condition increments its key
+                   ('insufficient_data', 'trend', 'crossover', 'rsi', 'atr').
+    :return: A Forecast record, or None.
     """
     if df is None or len(df) < 50:
         # Need at least 50 periods for EMA 50
+        if funnel is not None:
+            funnel['insufficient_data'] += 1
         return None
 
     # Get the last two candles for comparison
@@ -41,14 +49,24 @@ def check_long_signal(df, symbol, timeframe):
     # 4. Volatility Check: ATR is positive
     volatility_ok = last_candle['ATRr_14'] > 0
 
-    # --- Debug Logging ---
+    # --- Rejection Funnel / Debug Logging ---
     if not (ema_trend_ok and price_crossed_up_ema12 and rsi_ok and volatility_ok):
-        print(f"-> No signal for {symbol}. Reason:")
-        print(f"   - EMA Trend (12 > 50): {'OK' if ema_trend_ok else 'FAIL'} (EMA12: {last_candle['EMA_12']:.2f}, EMA50: {last_candle['EMA_50']:.2f})")
-        print(f"   - EMA Crossover: {'OK' if price_crossed_up_ema12 else 'FAIL'} (Prev Close: {prev_candle['close']:.2f}, Prev EMA12: {prev_candle['EMA_12']:.2f}; Last Close: {last_candle['close']:.2f}, Last EMA12: {last_candle['EMA_12']:.2f})")
-        print(f"   - RSI (40-70): {'OK' if rsi_ok else 'FAIL'} (RSI: {last_candle['RSI_14']:.2f})")
-        print(f"   - Volatility (ATR > 0): {'OK' if volatility_ok else 'FAIL'} (ATR: {last_candle['ATRr_14']:.4f})")
-
+        if funnel is not None:
+            funnel['trend'] += not ema_trend_ok
+            funnel['crossover'] += not price_crossed_up_ema12
+            funnel['rsi'] += not rsi_ok
+            funnel['atr'] += not volatility_ok
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "No signal: symbol=%s trend=%s (ema12=%.2f ema50=%.2f) crossover=%s (prev_close=%.2f prev_ema12=%.2f "
+                "close=%.2f ema12=%.2f) rsi=%s (%.2f) atr=%s (%.4f)",
+                symbol,
+                'OK' if ema_trend_ok else 'FAIL', last_candle['EMA_12'], last_candle['EMA_50'],
+                'OK' if price_crossed_up_ema12 else 'FAIL', prev_candle['close'], prev_candle['EMA_12'],
+                last_candle['close'], last_candle['EMA_12'],
+                'OK' if rsi_ok else 'FAIL', last_candle['RSI_14'],
+                'OK' if volatility_ok else 'FAIL', last_candle['ATRr_14'],
+            )
 
     # --- Signal Generation ---
     if ema_trend_ok and price_crossed_up_ema12 and rsi_ok and volatility_ok:
@@ -68,28 +86,28 @@ def check_long_signal(df, symbol, timeframe):
         )
 
         # --- Forecast Structure ---
-        forecast = {
-            'forecast_id': str(uuid.uuid4()),
-            'symbol': symbol,
-            'direction': 'LONG',
-            'timeframe': timeframe,
-            'entry_price': entry_price,
-            'stop_loss_price': stop_loss_price,
-            'take_profit1_price': take_profit_1,
-            'take_profit2_price': take_profit_2,
-            'sl_method': sl_params['method'],
-            'sl_params': sl_params,
-            'created_at': datetime.utcnow(),
-            'status': 'open',
-            'raw_signal': {
-                'ema12': last_candle['EMA_12'],
-                'ema50': last_candle['EMA_50'],
-                'rsi14': last_candle['RSI_14'],
-                'atr14': last_candle['ATRr_14'],
-                'close': last_candle['close'],
-                'timestamp': last_candle.name
-            }
-        }
+        forecast = Forecast(
+            forecast_id=str(uuid.uuid4()),
+            symbol=symbol,
+            direction='LONG',
+            timeframe=timeframe,
+            entry_price=float(entry_price),
+            stop_loss_price=float(stop_loss_price),
+            take_profit1_price=float(take_profit_1),
+            take_profit2_price=float(take_profit_2),
+            sl_method=sl_params['method'],
+            sl_params=sl_params,
+            created_at=datetime.utcnow(),
+            status='open',
+            raw_signal=RawSignal(
+                ema12=float(last_candle['EMA_12']),
+                ema50=float(last_candle['EMA_50']),
+                rsi14=float(last_candle['RSI_14']),
+                atr14=float(last_candle['ATRr_14']),
+                close=float(last_candle['close']),
+                timestamp=last_candle.name.to_pydatetime()
+            )
+        )
         return forecast
     
     return None
@@ -100,7 +118,7 @@ def calculate_stop_loss(entry_price, method, atr, df):
     if method == 'atr':
         k = DEFAULT_ATR_MULTIPLIER
         sl = entry_price - (atr * k)
-        sl_params['atr'] = atr
+        sl_params['atr'] = float(atr)
         sl_params['multiplier'] = k
     elif method == 'percentage':
         pct = DEFAULT_SL_PERCENTAGE
@@ -112,7 +130,7 @@ def calculate_stop_loss(entry_price, method, atr, df):
         lowest = swing_low_df['low'].min()
         sl = lowest
         sl_params['period'] = n
-        sl_params['lowest_price'] = lowest
+        sl_params['lowest_price'] = float(lowest)
     else:
         raise ValueError(f"Unknown stop-loss method: {method}")
         
@@ -149,6 +167,6 @@ if __name__ == '__main__':
             if signal:
                 print("✅ Signal Generated!")
                 import json
-                print(json.dumps(signal, default=str, indent=2))
+                print(json.dumps(signal.to_dict(), indent=2))
             else:
                 print("❌ No signal found under current conditions.")
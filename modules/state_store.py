@@ -0,0 +1,49 @@
+import logging
+import os
+import pickle
+from config import STATE_FILE
+from modules.data_fetcher import get_candle_state, load_candle_state
+from modules.indicator_calculator import get_indicator_state, load_indicator_state
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+
+def save_state():
+    """Snapshots candle and indicator caches to STATE_FILE."""
+    state = {
+        'version': STATE_VERSION,
+        'candles': get_candle_state(),
+        'indicators': get_indicator_state(),
+    }
+    tmp_file = STATE_FILE + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    # Replace atomically so an interrupted write never leaves a broken snapshot
+    os.replace(tmp_file, STATE_FILE)
+    logger.info("Saved state: %d candle series, %d indicator results.", len(state['candles']), len(state['indicators']))
+
+def restore_state():
+    """
+    Restores candle and indicator caches from STATE_FILE.
+    Returns True if a snapshot was loaded.
+    """
+    if not os.path.exists(STATE_FILE):
+        return False
+    try:
+        with open(STATE_FILE, 'rb') as f:
+            state = pickle.load(f)
+
+        if state.get('version') != STATE_VERSION:
+            logger.warning("Ignoring state snapshot with version %s.", state.get('version'))
+            return False
+
+        load_candle_state(state['candles'])
+        load_indicator_state(state['indicators'])
+        logger.info("Restored state: %d candle series, %d indicator results.",
+                    len(state['candles']), len(state['indicators']))
+        return True
+    except Exception as e:
+        # A broken snapshot only costs a cold start
+        logger.warning("Could not restore state from %s: %s", STATE_FILE, e)
+        return False
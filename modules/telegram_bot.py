@@ -1,12 +1,28 @@
+import asyncio
+import logging
 import os
-from aiogram import Bot, Dispatcher, types
-from aiogram.types import FSInputFile
-from aiogram.filters import Command
+from aiogram import Bot, Dispatcher, F, types
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, FSInputFile, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.filters import Command, CommandObject
 from aiogram.client.bot import DefaultBotProperties
-from config import TELEGRAM_BOT_TOKEN, BOT_USER_ID, DEFAULT_BALANCE_USDT
-from modules.database import get_all_open_forecasts, get_user_profile, get_all_forecasts
+from config import TELEGRAM_BOT_TOKEN, BOT_USER_ID, DEFAULT_BALANCE_USDT, DEFAULT_TIMEFRAME
+from modules.bot_snapshot import get_snapshot
+from modules.chart_renderer import get_chart
+from modules.data_fetcher import get_cached_price, fetch_ohlcv
+from modules.indicator_calculator import add_indicators
+
+logger = logging.getLogger(__name__)
 
 DB_FILE_PATH = "db.json"
+STATUS_PAGE_SIZE = 10
+
+# Exchange used by /chart to fetch candles; set by main
+_exchange = None
+
+def set_exchange(exchange):
+    global _exchange
+    _exchange = exchange
 
 # --- Инициализация бота и диспетчера ---
 bot = Bot(
@@ -18,21 +34,21 @@ dp = Dispatcher()
 # --- Форматирование сообщений ---
 def format_signal_message(forecast):
     user_balance = DEFAULT_BALANCE_USDT
-    entry = forecast['entry_price']
-    sl = forecast['stop_loss_price']
-    tp1 = forecast['take_profit1_price']
-    tp2 = forecast['take_profit2_price']
+    entry = forecast.entry_price
+    sl = forecast.stop_loss_price
+    tp1 = forecast.take_profit1_price
+    tp2 = forecast.take_profit2_price
 
     risk_percentage = ((entry - sl) / entry) * 100
     profit_percent = ((tp1 - entry) / entry) * 100
     profit_usd = user_balance * (profit_percent / 100)
 
     message = (
-        f"⚡ **Сигнал** (ID: `{forecast['forecast_id'][:4]}`)\n"
+        f"⚡ **Сигнал** (ID: `{forecast.forecast_id[:4]}`)\n"
         f"━━━━━━━━━━━━━━━━━━\n"
-        f"📌 **Пара:** `{forecast['symbol']}`\n"
-        f"⏱ **Таймфрейм:** `{forecast['timeframe']}`\n"
-        f"📈 **Напрям:** *{forecast['direction']}*\n"
+        f"📌 **Пара:** `{forecast.symbol}`\n"
+        f"⏱ **Таймфрейм:** `{forecast.timeframe}`\n"
+        f"📈 **Напрям:** *{forecast.direction}*\n"
         f"💎 **Вхід:** `{entry:.6f}` USDT\n"
         f"🛡 **Стоп-лосс:** `{sl:.6f}` USDT\n"
         f"🎯 **ТП1:** `{tp1:.6f}` USDT\n"
@@ -40,7 +56,7 @@ def format_signal_message(forecast):
         f"🔥 Потенційний прибуток: `{profit_usd:.4f}` USDT ({profit_percent:.2f}%)\n"
         f"⚠ Ризик: `{risk_percentage:.2f}%`\n"
         f"👤 Баланс користувача: `{user_balance}` USDT\n"
-        f"🕒 Створено: `{forecast['created_at'].strftime('%Y-%m-%d %H:%M')} UTC`\n"
+        f"🕒 Створено: `{forecast.created_at.strftime('%Y-%m-%d %H:%M')} UTC`\n"
         f"🤖 _Сигнал відстежується автоматично._"
     )
     return message
@@ -51,13 +67,13 @@ def format_closure_message(closed_forecast):
         'HIT_TP2': '✅ Take Profit 2 Hit',
         'HIT_SL': '❌ Stop-Loss Hit'
     }
-    duration_hours = closed_forecast.get('duration_seconds', 0) / 3600
+    duration_hours = (closed_forecast.duration_seconds or 0) / 3600
     message = (
-        f"🔔 **POSITION CLOSED** (ID: `{closed_forecast['forecast_id'][:4]}`)\n"
-        f"**PAIR:** `{closed_forecast['symbol']}`\n"
-        f"**OUTCOME:** {outcome_map.get(closed_forecast['outcome'], 'UNKNOWN')}\n"
-        f"**Entry Price:** `{closed_forecast['entry_price']:.4f}`\n"
-        f"**Hit Price:** `{closed_forecast['hit_price']:.4f}`\n"
+        f"🔔 **POSITION CLOSED** (ID: `{closed_forecast.forecast_id[:4]}`)\n"
+        f"**PAIR:** `{closed_forecast.symbol}`\n"
+        f"**OUTCOME:** {outcome_map.get(closed_forecast.outcome, 'UNKNOWN')}\n"
+        f"**Entry Price:** `{closed_forecast.entry_price:.4f}`\n"
+        f"**Hit Price:** `{closed_forecast.hit_price:.4f}`\n"
         f"**Duration:** `{duration_hours:.2f}` hours"
     )
     return message
@@ -72,35 +88,78 @@ async def cmd_start(message: types.Message):
 <b>📌 Commands:</b>
 • /status - view open positions
 • /analytics - view analytics
+• /chart SYMBOL [timeframe] - chart with indicators and levels
 • /get_db - download db.json file
         """,
         parse_mode="HTML"
     )
 
+def format_status_page(snapshot, page):
+    """
+    Renders one page of open positions with unrealised PnL from cached prices.
+
+    :return: A tuple of (text, inline keyboard or None).
+    """
+    forecasts = snapshot.open_forecasts
+    pages = max(1, -(-len(forecasts) // STATUS_PAGE_SIZE))
+    page = min(max(page, 0), pages - 1)
+
+    text = f"**📊 Open Positions** ({len(forecasts)}):\n\n"
+    for forecast in forecasts[page * STATUS_PAGE_SIZE:(page + 1) * STATUS_PAGE_SIZE]:
+        entry = forecast.entry_price
+        text += (
+            f"`{forecast.symbol}` (ID: `{forecast.forecast_id[:4]}`)\n"
+            f"Entry: `{entry:.6f}` SL: `{forecast.stop_loss_price:.6f}` TP1: `{forecast.take_profit1_price:.6f}`\n"
+        )
+        price = get_cached_price(forecast.symbol)
+        if price is not None:
+            pnl_percent = ((price - entry) / entry) * 100
+            pnl_usd = DEFAULT_BALANCE_USDT * (pnl_percent / 100)
+            text += f"Price: `{price:.6f}` PnL: `{pnl_usd:+.4f}` USDT ({pnl_percent:+.2f}%)\n"
+        text += "\n"
+
+    if pages == 1:
+        return text, None
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="◀️", callback_data=f"status:{max(page - 1, 0)}"),
+        InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data=f"status:{page}"),
+        InlineKeyboardButton(text="▶️", callback_data=f"status:{min(page + 1, pages - 1)}"),
+    ]])
+    return text, keyboard
+
 @dp.message(Command("status"))
 async def cmd_status(message: types.Message):
-    open_forecasts = get_all_open_forecasts()
-    if not open_forecasts:
+    snapshot = await get_snapshot()
+    if not snapshot.open_forecasts:
         await message.answer("No open positions.")
         return
-    text = "**📊 Open Positions:**\n"
-    for symbol, forecast in open_forecasts.items():
-        text += f"{symbol} - Entry: {forecast['entry_price']}, SL: {forecast['stop_loss_price']}, TP1: {forecast['take_profit1_price']}\n\n\n"
-    await message.answer(text)
+    text, keyboard = format_status_page(snapshot, 0)
+    await message.answer(text, reply_markup=keyboard)
+
+@dp.callback_query(F.data.startswith("status:"))
+async def cb_status_page(callback: types.CallbackQuery):
+    snapshot = await get_snapshot()
+    if snapshot.open_forecasts:
+        text, keyboard = format_status_page(snapshot, int(callback.data.split(":", 1)[1]))
+    else:
+        text, keyboard = "No open positions.", None
+    try:
+        await callback.message.edit_text(text, reply_markup=keyboard)
+    except TelegramBadRequest:
+        # Same content again: Telegram rejects edits without changes
+        pass
+    await callback.answer()
 
 @dp.message(Command("analytics"))
 async def cmd_analytics(message: types.Message):
-    forecasts = get_all_forecasts()
-    if not forecasts:
+    snapshot = await get_snapshot()
+    if not snapshot.total:
         await message.answer("Нет данных для анализа.")
         return
-    total = len(forecasts)
-    wins = [f for f in forecasts if f.get('outcome') in ('HIT_TP1','HIT_TP2')]
-    losses = [f for f in forecasts if f.get('outcome') == 'HIT_SL']
     await message.answer(
-        f"Всего прогнозов: {total}\n"
-        f"✅ Успешных: {len(wins)}\n"
-        f"❌ Неудачных: {len(losses)}"
+        f"Всего прогнозов: {snapshot.total}\n"
+        f"✅ Успешных: {snapshot.wins}\n"
+        f"❌ Неудачных: {snapshot.losses}"
     )
 
 @dp.message(Command("get_db"))
@@ -113,6 +172,56 @@ async def cmd_get_db(message: types.Message):
     file = FSInputFile(DB_FILE_PATH, filename="db.json")
     await message.answer_document(file, caption="📂 db.json")
 
+def _parse_symbol(text):
+    """Normalizes 'btc', 'BTCUSDT' or 'BTC/USDT' to 'BTC/USDT'."""
+    symbol = text.strip().upper()
+    if '/' in symbol:
+        return symbol
+    if symbol.endswith('USDT') and len(symbol) > 4:
+        symbol = symbol[:-4]
+    return f"{symbol}/USDT"
+
+@dp.message(Command("chart"))
+async def cmd_chart(message: types.Message, command: CommandObject):
+    args = (command.args or '').split()
+    if not args:
+        await message.answer("Usage: /chart SYMBOL [timeframe], e.g. /chart BTC 1h")
+        return
+    symbol = _parse_symbol(args[0])
+    timeframe = args[1] if len(args) > 1 else DEFAULT_TIMEFRAME
+
+    if _exchange is None:
+        await message.answer("⏳ Exchange is still initializing, try again shortly.")
+        return
+    # Always refresh: cached candles may be stale (pair left the top-N, restored snapshot).
+    # With a warm cache this is a cheap incremental fetch.
+    df = await asyncio.to_thread(fetch_ohlcv, _exchange, symbol, timeframe, 200)
+    if df is None:
+        await message.answer(f"❌ No data for `{symbol}` on `{timeframe}`.")
+        return
+    df = await asyncio.to_thread(add_indicators, df, symbol, timeframe)
+
+    snapshot = await get_snapshot()
+    forecast = next(
+        (f for f in snapshot.open_forecasts if f.symbol == symbol and f.timeframe == timeframe), None
+    )
+    try:
+        image = await get_chart(symbol, timeframe, df, forecast)
+    except Exception:
+        # get_chart already logged the traceback
+        await message.answer(f"❌ Chart unavailable for `{symbol}` right now, try again later.")
+        return
+    await message.answer_photo(BufferedInputFile(image, filename="chart.png"), caption=f"`{symbol}` · `{timeframe}`")
+
 # --- Функция для отправки сообщений вручную ---
 async def send_message(user_id: int, message: str):
     await bot.send_message(chat_id=user_id, text=message, parse_mode="Markdown")
+
+async def send_signal(user_id: int, forecast, chart: bytes = None):
+    """Sends a signal message, attaching the pre-rendered chart if there is one."""
+    message = format_signal_message(forecast)
+    if chart is None:
+        await send_message(user_id, message)
+        return
+    photo = BufferedInputFile(chart, filename="chart.png")
+    await bot.send_photo(chat_id=user_id, photo=photo, caption=message, parse_mode="Markdown")